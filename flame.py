@@ -1,8 +1,16 @@
 #!/usr/bin/env python
+import bz2
 import curses
+import gzip
+import heapq
+import io
+import lzma
 import os
+import re
 import sys
-from itertools import groupby, tee, chain
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, groupby, chain
 from operator import attrgetter, itemgetter
 from random import randint
 
@@ -78,13 +86,93 @@ class Colors256:
     def highlight_color():
         return Colors256.color_count + 2
 
+# histogram of samples over time buckets, used for time-sliced profiles.
+# It is kept as bucket -> samples dict while being built or modified, and
+# turned into compact form once queried: only non-empty buckets are stored,
+# together with running totals, so number of samples within a range of
+# buckets takes two lookups
+class TimeHistogram:
+    def __init__(self, counts = None):
+        self._counts = counts if counts is not None else {}
+        self.buckets = None
+        self.cumulative = None
+
+    # zero counts are never stored, so all buckets are non-empty
+    def compact(self):
+        if self._counts is None:
+            return
+        counts = sorted(self._counts.items())
+        self.buckets = array('l', [b for (b, _) in counts])
+        self.cumulative = array('q', accumulate([c for (_, c) in counts], initial=0))
+        self._counts = None
+
+    # samples in buckets [lo, hi)
+    def samples(self, lo, hi):
+        if self._counts is not None:
+            self.compact()
+        c = self.cumulative
+        return c[bisect_left(self.buckets, hi)] - c[bisect_left(self.buckets, lo)]
+
+    def is_empty(self):
+        if self._counts is not None:
+            return not self._counts
+        return len(self.buckets) == 0
+
+    # bucket -> samples, should not be modified by the caller
+    def counts(self):
+        if self._counts is not None:
+            return self._counts
+        c = self.cumulative
+        return {b: c[i + 1] - c[i] for (i, b) in enumerate(self.buckets)}
+
+    # adds (sign = 1) or subtracts (sign = -1) other histogram
+    def add(self, other, sign = 1):
+        if self._counts is None:
+            self._counts = self.counts()
+            self.buckets = None
+            self.cumulative = None
+        counts = self._counts
+        if sign == 1:
+            # counts are positive, so none of the buckets becomes empty.
+            # This is the case for all histograms added while building
+            for (b, n) in other.counts().items():
+                counts[b] = counts.get(b, 0) + n
+            return
+        for (b, n) in other.counts().items():
+            v = counts.get(b, 0) + sign * n
+            if v == 0:
+                counts.pop(b, None)
+            else:
+                counts[b] = v
+
+    @staticmethod
+    def merge_counts(counts):
+        counts = [c for c in counts if c]
+        if not counts:
+            return {}
+        # start from a copy of the largest one, the rest are added to it
+        counts.sort(key=len)
+        res = dict(counts.pop())
+        for c in counts:
+            for (b, n) in c.items():
+                res[b] = res.get(b, 0) + n
+        return res
+
 # Frame represents stack frame itself, not its representation on the scren
 class Frame:
-    def __init__(self, title, samples, children):
+    def __init__(self, title, samples, children, self_samples = None):
         self.title = title
         self.samples = samples
         self.children = children
         self.parent = None
+        # exclusive samples, the ones where this frame is the leaf
+        if self_samples is None:
+            self_samples = samples - sum([f.samples for f in children])
+        self.self_samples = self_samples
+
+    # frame with no samples at all, regardless of time range
+    def is_empty(self):
+        return self.samples == 0
 
     # returns number of samples which belong to frame (or its children)
     # which match the title (strict equality).
@@ -107,6 +195,41 @@ class Frame:
             return [self]
         return list(chain.from_iterable([f.all_by_title(title) for f in self.children]))
 
+# frame of a time-sliced profile. Samples are not stored, they are computed
+# from histograms for the current time range when needed, so changing
+# the range doesn't require visiting all the frames
+class TimedFrame(Frame):
+    def __init__(self, title, children, hist, self_hist, time_range):
+        self.title = title
+        self.children = children
+        self.parent = None
+        # total and exclusive samples over time
+        self.hist = hist
+        self.self_hist = self_hist
+        # [(lo, hi)] in buckets, shared by all frames of the frame set
+        self.time_range = time_range
+        # (time range, samples), samples are read many times while
+        # building views, range is compared by identity
+        self._cached = None
+
+    @property
+    def samples(self):
+        r = self.time_range[0]
+        if self._cached is None or self._cached[0] is not r:
+            self._cached = (r, self.hist.samples(*r))
+        return self._cached[1]
+
+    # to be called when histogram is modified
+    def reset_cache(self):
+        self._cached = None
+
+    @property
+    def self_samples(self):
+        return self.self_hist.samples(*self.time_range[0])
+
+    def is_empty(self):
+        return self.hist.is_empty()
+
 # representation of a frame on a screen, with specific location/size
 class FrameView(object):
     def __init__(self, x, y, w, frames, truncated = False):
@@ -199,31 +322,253 @@ class SingleFrameView(FrameView):
 def view_contains(view, x, y):
     return view.y == y and x >= view.x and x < view.x + view.w
 
-# reading stacks from stdin
+# compressed inputs are detected by magic bytes and decompressed on the fly
+compressed_formats = [
+    (b'\x1f\x8b', lambda f: gzip.GzipFile(fileobj=f, mode='rb')),
+    (b'\xfd7zXZ\x00', lzma.LZMAFile),
+    (b'BZh', bz2.BZ2File),
+]
+
+# large buffers keep decompression from being split into many small reads
+read_buffer_size = 1 << 20
+
+# binary stream which returns already consumed head first, then the rest
+# of the underlying stream. Doesn't close the underlying stream
+class PrefixedStream(io.RawIOBase):
+    def __init__(self, head, raw):
+        self.head = head
+        self.raw = raw
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self.head:
+            return self.raw.readinto(b)
+        n = min(len(b), len(self.head))
+        b[:n] = self.head[:n]
+        self.head = self.head[n:]
+        return n
+
+# wraps binary stream, decompressing it if needed, returns text stream
+def open_input(raw):
+    # peek() on a pipe returns whatever single read delivers, which might
+    # be shorter than magic bytes. read() blocks until it has all of them
+    head = raw.read(6)
+    stream = io.BufferedReader(PrefixedStream(head, raw), read_buffer_size)
+    for (magic, opener) in compressed_formats:
+        if head.startswith(magic):
+            stream = io.BufferedReader(opener(stream), read_buffer_size)
+            break
+    return io.TextIOWrapper(stream)
+
+# perf script output is a sequence of samples separated by empty lines.
+# Each sample is a header followed by the stack, leaf first:
+#   comm  pid/tid [cpu] timestamp: period event:
+#           addr symbol+offset (dso)
+perf_header = re.compile(r'^(\S.*?)\s+\d+(?:/\d+)?\s+(?:\[\d+\]\s+)?(\d+\.\d+):')
+
+# samples are counted in time buckets of time_resolution seconds. Once
+# the profile gets longer than time_buckets buckets, adjacent buckets are
+# merged, doubling their duration, so memory doesn't grow with the length
+time_resolution = 0.01
+time_buckets = 200
+
+def perf_symbol(line):
+    parts = line.strip().split(' ', 1)
+    if len(parts) < 2:
+        return '[unknown]'
+    symbol = parts[1]
+    if symbol.endswith(')') and ' (' in symbol:
+        symbol = symbol.rpartition(' (')[0]
+    if '+0x' in symbol:
+        symbol = symbol.rpartition('+0x')[0]
+    return symbol if symbol else '[unknown]'
+
+# reads timestamped samples from perf script output.
+# returns list of (stack, samples, {bucket: samples}) and
+# (number of buckets, bucket duration in seconds)
+def read_perf_script(lines):
+    # stack -> {bucket: samples}, buckets are counted from the first sample
+    # and might be negative, as samples are not strictly ordered by time
+    stacks = {}
+    start = None
+    duration = time_resolution
+    (lo, hi) = (0, 0)
+    header = None
+    stack = []
+    # empty line at the end completes the last sample
+    for l in chain(lines, ['\n']):
+        if l.startswith('#'):
+            continue
+        if not l.strip():
+            if header is not None:
+                (comm, t) = header
+                if start is None:
+                    start = t
+                b = int((t - start) // duration)
+                hist = stacks.setdefault((comm,) + tuple(reversed(stack)), {})
+                hist[b] = hist.get(b, 0) + 1
+                (lo, hi) = (min(lo, b), max(hi, b))
+                while hi - lo >= time_buckets:
+                    duration *= 2
+                    (lo, hi) = (lo // 2, hi // 2)
+                    for key in stacks:
+                        merged = {}
+                        for (k, n) in stacks[key].items():
+                            merged[k // 2] = merged.get(k // 2, 0) + n
+                        stacks[key] = merged
+            header = None
+            stack = []
+            continue
+        if l[0].isspace():
+            if header is not None:
+                stack.append(perf_symbol(l))
+            continue
+        m = perf_header.match(l)
+        header = (m.group(1), float(m.group(2))) if m else None
+
+    if not stacks:
+        return ([], None)
+    data = []
+    for (stack, hist) in stacks.items():
+        hist = {b - lo: n for (b, n) in hist.items()}
+        data.append((list(stack), sum(hist.values()), hist))
+    return (data, (hi - lo + 1, duration))
+
+# reads collapsed stacks, one 'a;b;c count' per line
+def read_collapsed(lines):
+    data = []
+    for l in lines:
+        (stacks, _, cnt) = l.strip().rpartition(' ')
+        data.append((stacks.split(';'), int(cnt))) 
+    return data
+
+# reading stacks from stdin, either collapsed or perf script output.
+# returns data and timeline, which is None for collapsed stacks
 def read_stdin():
     # to read both piped stdin and use tty in curses
     os.dup2(0, 4)
     os.close(0)
     sys.stdin = open('/dev/tty', 'r')
 
-    data = []
-    with os.fdopen(4, 'r') as stdin_piped:
-        for l in stdin_piped.readlines():
-            (stacks, _, cnt) = l.strip().rpartition(' ')
-            data.append((stacks.split(';'), int(cnt))) 
-
-    return data
+    # decompressors don't close the stream they read from, so it is
+    # closed separately
+    piped = os.fdopen(4, 'rb', read_buffer_size)
+    with piped, open_input(piped) as stdin_piped:
+        # format is detected by the first meaningful line
+        head = []
+        for l in stdin_piped:
+            head.append(l)
+            if l.strip() and not l.startswith('#'):
+                break
+        lines = chain(head, stdin_piped)
+        if head and perf_header.match(head[-1]):
+            return read_perf_script(lines)
+        return (read_collapsed(lines), None)
 
 # set of all frames.
 class FrameSet:
-    def __init__(self, data):
+    # data is a list of (stack, samples) or, for time-sliced profiles
+    # with buckets > 0, (stack, samples, {bucket: samples})
+    def __init__(self, data, buckets = 0):
+        self.buckets = buckets
+        # per-title aggregates, filled in while building the frames and
+        # kept up to date on exclusion/hard focus.
+        # self_by_title  - exclusive samples of all frames with the title
+        # total_by_title - inclusive samples, each sample counted once even
+        #                  if the title appears several times in the stack
+        # for time-sliced profiles these are TimeHistograms
+        self.self_by_title = {}
+        self.total_by_title = {}
+        self.hist = None
+        # time range [lo, hi) in buckets, shared with the frames
+        self._time_range = [(0, buckets)]
+        # shared by frames with no exclusive samples
+        self._no_samples = TimeHistogram()
         # this is a list of top-level frames
-        self.frames = self._build_frames(data)
-        self.total_samples = sum([a for (_, a) in data])
+        if buckets:
+            self.hist = TimeHistogram(TimeHistogram.merge_counts(d[2] for d in data))
+            self.frames = self._build_timed_frames([(s, h) for (s, _, h) in data])
+        else:
+            self.frames = self._build_frames(data)
+        self.total_samples = sum([d[1] for d in data])
         self.total_excluded = 0
 
+    @property
+    def time_range(self):
+        return self._time_range[0]
+
+    # samples of the title in per-title aggregate, within current time range
+    def _title_samples(self, agg, title):
+        v = agg.get(title)
+        if v is None:
+            return 0
+        return v.samples(*self.time_range) if self.buckets else v
+
     def samples_with_title(self, title):
-        return sum([f.samples_with_title(title) for f in self.frames])
+        return self._title_samples(self.total_by_title, title)
+
+    # returns up to n (title, self samples, total samples) tuples
+    # with largest self (or total) samples
+    def top_titles(self, n, by_self = True):
+        agg = self.self_by_title if by_self else self.total_by_title
+        samples = ((t, self._title_samples(agg, t)) for t in agg)
+        top = heapq.nlargest(n, (ts for ts in samples if ts[1] > 0), key=itemgetter(1))
+        return [(t, self._title_samples(self.self_by_title, t), self._title_samples(self.total_by_title, t)) for (t, _) in top]
+
+    # ancestors is title -> count of frames with the title above the
+    # current one. It is shared along the recursion and updated in place
+    @staticmethod
+    def _enter(ancestors, title):
+        ancestors[title] = ancestors.get(title, 0) + 1
+
+    @staticmethod
+    def _leave(ancestors, title):
+        if ancestors[title] == 1:
+            del ancestors[title]
+        else:
+            ancestors[title] -= 1
+
+    # adds (sign = 1) or removes (sign = -1) frame's samples to per-title
+    # aggregates. ancestors contains titles above the frame in the stack
+    def _account_frame(self, frame, ancestors, sign):
+        title = frame.title
+        if self.buckets:
+            self._add_hist(self.self_by_title, title, frame.self_hist, sign)
+            if title not in ancestors:
+                self._add_hist(self.total_by_title, title, frame.hist, sign)
+            return
+        if frame.self_samples:
+            v = self.self_by_title.get(title, 0) + sign * frame.self_samples
+            if v == 0:
+                del self.self_by_title[title]
+            else:
+                self.self_by_title[title] = v
+        if title not in ancestors:
+            v = self.total_by_title.get(title, 0) + sign * frame.samples
+            if v == 0:
+                self.total_by_title.pop(title, None)
+            else:
+                self.total_by_title[title] = v
+
+    @staticmethod
+    def _add_hist(agg, title, hist, sign):
+        if hist.is_empty():
+            return
+        h = agg.get(title)
+        if h is None:
+            h = agg[title] = TimeHistogram()
+        h.add(hist, sign)
+        if h.is_empty():
+            del agg[title]
+
+    def _unaccount_subtree(self, frame, ancestors):
+        self._account_frame(frame, ancestors, -1)
+        self._enter(ancestors, frame.title)
+        for f in frame.children:
+            self._unaccount_subtree(f, ancestors)
+        self._leave(ancestors, frame.title)
 
     # is used to remove empty parents
     def _exclude_frame(self, frame):
@@ -234,29 +579,67 @@ class FrameSet:
 
     def exclude_frames(self, frames):
         for frame in frames:
+            # ancestors lose the samples once per title, self samples
+            # of ancestors do not change
+            ancestors = {}
+            parent = frame.parent
+            while parent != None:
+                self._enter(ancestors, parent.title)
+                parent = parent.parent
+            for title in ancestors:
+                if self.buckets:
+                    self._add_hist(self.total_by_title, title, frame.hist, -1)
+                    continue
+                self.total_by_title[title] -= frame.samples
+                if self.total_by_title[title] == 0:
+                    del self.total_by_title[title]
+            self._unaccount_subtree(frame, ancestors)
+
             self._exclude_frame(frame)
             samples = frame.samples
-            frame.samples = 0
+            hist = frame.hist if self.buckets else None
+            if not self.buckets:
+                frame.samples = 0
+                frame.self_samples = 0
             self.total_excluded += samples
             self.total_samples -= samples
             while frame.parent != None:
-                frame.parent.samples -= samples
-                if frame.parent.samples == 0:
+                if hist is not None:
+                    # histograms might be shared, so parent gets a new one
+                    parent_hist = TimeHistogram(dict(frame.parent.hist.counts()))
+                    parent_hist.add(hist, -1)
+                    frame.parent.hist = parent_hist
+                    frame.parent.reset_cache()
+                else:
+                    frame.parent.samples -= samples
+                # parent might have no samples in current time range only
+                if frame.parent.is_empty():
                     assert(len(frame.parent.children) == 0)
                     # remove the parent as well
                     self._exclude_frame(frame.parent)
                 frame = frame.parent
 
-    def _merge_frames(self, frames):
+    def _merge_frames(self, frames, ancestors = None):
+        if ancestors is None:
+            ancestors = {}
         title = lambda f: f.title
         res = []
         for k, g in groupby(sorted(frames, key=title), title):
             # TODO no need to make a list here
             to_merge = list(g)
             all_children = list(chain.from_iterable([ff.children for ff in to_merge]))
-            f = Frame(k, sum([ff.samples for ff in to_merge]), self._merge_frames(all_children))
+            self._enter(ancestors, k)
+            children = self._merge_frames(all_children, ancestors)
+            self._leave(ancestors, k)
+            if self.buckets:
+                hist = TimeHistogram(TimeHistogram.merge_counts(ff.hist.counts() for ff in to_merge))
+                self_hist = TimeHistogram(TimeHistogram.merge_counts(ff.self_hist.counts() for ff in to_merge))
+                f = TimedFrame(k, children, hist, self_hist, self._time_range)
+            else:
+                f = Frame(k, sum([ff.samples for ff in to_merge]), children)
             for ff in f.children:
                 ff.parent = f
+            self._account_frame(f, ancestors, 1)
             res.append(f)
         return res
 
@@ -266,28 +649,111 @@ class FrameSet:
     def hard_focus(self, title):
         frames = list(chain.from_iterable([f.all_by_title(title) for f in self.frames]))
         # we have single root, and need to merge children
+        # aggregates are rebuilt while merging
+        self.self_by_title = {}
+        self.total_by_title = {}
         roots = self._merge_frames(frames)
         assert(len(roots) == 1)
         self.frames = roots
         self.total_excluded += (self.total_samples - roots[0].samples)
         self.total_samples = roots[0].samples
 
-    def _build_frames(self, data):
+    def _build_frames(self, data, ancestors = None):
         if not data:
             return None
+        if ancestors is None:
+            ancestors = {}
         res = []
+        self_by_title = self.self_by_title
+        total_by_title = self.total_by_title
         data = sorted([(s[0], s[1:], n) for (s, n) in data if s])
         for f, it in groupby(data, itemgetter(0)):
-            it1, it2 = tee(it)
-            samples = sum(cnt for (_, _, cnt) in it1)
-            children = ((s, cc) for (_, s, cc) in it2)
-            frame = Frame(f, samples, self._build_frames(children))
+            group = list(it)
+            samples = 0
+            # samples of stacks which end at this frame
+            self_samples = 0
+            for (_, s, cnt) in group:
+                samples += cnt
+                if not s:
+                    self_samples += cnt
+            children = ((s, cc) for (_, s, cc) in group)
+            # this is called for every frame, so _enter/_leave and
+            # _account_frame are inlined
+            depth = ancestors.get(f, 0)
+            ancestors[f] = depth + 1
+            children = self._build_frames(children, ancestors)
+            if depth == 0:
+                del ancestors[f]
+                total_by_title[f] = total_by_title.get(f, 0) + samples
+            else:
+                ancestors[f] = depth
+            if self_samples:
+                self_by_title[f] = self_by_title.get(f, 0) + self_samples
+            frame = Frame(f, samples, children, self_samples)
             for ff in frame.children:
                 ff.parent = frame
             res.append(frame)
 
         return res
 
+    # same as _build_frames for time-sliced profiles, data is a list of
+    # (stack, {bucket: samples})
+    def _build_timed_frames(self, data, ancestors = None):
+        if not data:
+            return None
+        if ancestors is None:
+            ancestors = {}
+        res = []
+        data = sorted([(s[0], s[1:], h) for (s, h) in data if s], key=itemgetter(0))
+        for f, it in groupby(data, itemgetter(0)):
+            group = list(it)
+            # stacks which end at this frame
+            self_counts = TimeHistogram.merge_counts(h for (_, s, h) in group if not s)
+            children = ((s, h) for (_, s, h) in group)
+            depth = ancestors.get(f, 0)
+            ancestors[f] = depth + 1
+            children = self._build_timed_frames(children, ancestors)
+            if depth == 0:
+                del ancestors[f]
+            else:
+                ancestors[f] = depth
+            # histogram is built bottom-up from children's ones.
+            # Frame histograms are never modified, so they are shared
+            # where possible, e.g. in a chain of single children
+            self_hist = TimeHistogram(self_counts) if self_counts else self._no_samples
+            if not children:
+                hist = self_hist
+            elif not self_counts and len(children) == 1:
+                hist = children[0].hist
+            else:
+                hist = TimeHistogram(TimeHistogram.merge_counts([self_counts] + [ff.hist.counts() for ff in children]))
+            frame = TimedFrame(f, children, hist, self_hist, self._time_range)
+            for ff in frame.children:
+                ff.parent = frame
+            self._account_frame(frame, ancestors, 1)
+            # children's histograms are not needed as dicts any more,
+            # except the one shared with the frame, it is compacted by
+            # the frame's parent
+            for ff in frame.children:
+                for h in (ff.hist, ff.self_hist):
+                    if h is not hist:
+                        h.compact()
+            res.append(frame)
+
+        return res
+
+    # changes time range [lo, hi) in buckets. Frames and per-title aggregates
+    # compute samples from histograms on access, so only totals are updated
+    def set_time_range(self, lo, hi):
+        self._time_range[0] = (lo, hi)
+        self.total_samples = sum([f.samples for f in self.frames])
+        self.total_excluded = self.hist.samples(lo, hi) - self.total_samples
+
+    # samples over time of the frames left after exclusions and hard focus,
+    # self.hist is the whole profile
+    def shown_hist(self):
+        return TimeHistogram(TimeHistogram.merge_counts([f.hist.counts() for f in self.frames or []]))
+
     # prepare views at current level of granularity and position
     # frames - group of frames with common parent, which we need to generate
     #          view for
@@ -302,13 +768,17 @@ class FrameSet:
         # these are 'small' frames
         leftovers = []
         for f in frames:
-            w = int(width * f.samples / s)
+            # for time-sliced profiles this is computed on access
+            samples = f.samples
+            if samples == 0:
+                continue
+            w = int(width * samples / s)
             assert isinstance(w, int)
             if w < 4:
                 leftovers.append(f)
                 continue
             res.append(SingleFrameView(x, y, w, f))
-            res += self._get_views_rec(f.children, w, f.samples, x, y + 1)
+            res += self._get_views_rec(f.children, w, samples, x, y + 1)
             x = x + w
         
         # for now just append as a single frame view
@@ -347,6 +817,8 @@ class FrameSet:
 
         res = [SingleFrameView(0, i, width, f) for (i, f) in enumerate(root_path)]
         samples = sum([f.samples for f in focus])
+        if samples == 0:
+            return []
         res = res + self._get_views_rec(focus, width, samples, 0, len(res)) 
         res.sort(key = attrgetter("y", "x"))
 
@@ -382,7 +854,8 @@ class FlameCLI:
         stdscr.clear()
         self.status_area = StatusArea(self.stdscr)
         Colors256.init()
-        self.data = read_stdin()
+        # timeline is (buckets, bucket duration) for time-sliced profiles
+        (self.data, self.timeline) = read_stdin()
         self.build()
         self.render()
 
@@ -425,7 +898,7 @@ class FlameCLI:
         # new 'root level'
         self.pinned = None
 
-        self.frames = FrameSet(self.data)
+        self.frames = FrameSet(self.data, self.timeline[0] if self.timeline else 0)
         self.frame_views = self.frames.get_frame_views(self.stdscr.getmaxyx()[1])        
         self.fit_into_vertical_space()
         self.build_screen_index()
@@ -479,6 +952,8 @@ class FlameCLI:
         if excluded > 0:
             pe = 100.0 * excluded / (samples + excluded)
             w.append("{:.2f}% samples excluded".format(pe))
+        if self.timeline and self.frames.time_range != (0, self.timeline[0]):
+            w.append(self._time_range_text())
         warning = "|".join(w)
         self.status_area.draw(status, warning)
 
@@ -510,10 +985,14 @@ class FlameCLI:
             self.stdscr.refresh()
 
     def select_up(self):
+        if not self.frame_views:
+            return
         if self.change_selection(self.selected_view().parent_index):
             self.stdscr.refresh()
 
     def select_down(self):
+        if not self.frame_views:
+            return
         if self.change_selection(self.selected_view().first_child_index):
             self.stdscr.refresh()
 
@@ -556,7 +1035,7 @@ class FlameCLI:
         while f:
             if samples(f) > 0:
                 return f
-            f = [f[0].parent]
+            f = [f[0].parent] if f[0].parent is not None else []
         return None
 
     def exclude_frame(self):
@@ -641,6 +1120,148 @@ class FlameCLI:
         self.rebuild_views(frames)
         self.render()
 
+    # returns index of single frame view with the title, if there's one.
+    # Views which only contain the title in aggregated or truncated
+    # frames don't count, selecting them wouldn't select the function
+    def _find_title_view(self, title):
+        for (i, v) in enumerate(self.frame_views):
+            if v.frame_count() == 1 and v.frames[0].title == title:
+                return i
+        return None
+
+    # selects view with the title. If it is not visible, e.g. it is too
+    # deep in the stack to fit on the screen, focuses on the frame with the
+    # title which has most samples, pinned right below its caller
+    def jump_to_title(self, title):
+        i = self._find_title_view(title)
+        if i is not None:
+            self.do_highlight(i)
+            return
+        frames = list(chain.from_iterable([f.all_by_title(title) for f in self.frames.frames]))
+        if not frames:
+            self.render()
+            return
+        frame = max(frames, key=attrgetter('samples'))
+        self.focus = [frame]
+        self.pinned = [frame.parent] if frame.parent is not None else None
+        self.rebuild_views([frame])
+        self.render()
+
+    # 't'
+    # shows functions with most self (or total) samples, uses aggregates
+    # maintained by frame set, so no tree traversal is needed
+    def top_functions(self):
+        if not self.frame_views:
+            return
+        total = self.frames.total_samples + self.frames.total_excluded
+        by_self = True
+        selection = 0
+        while True:
+            rows, cols = self.stdscr.getmaxyx()
+            if rows < 2:
+                return
+            top = self.frames.top_titles(rows - 1, by_self)
+            selection = min(selection, len(top) - 1)
+            self.stdscr.clear()
+            header = "Top functions by {} samples (self% total%); s - sort, enter - jump, t/q - close"
+            self.stdscr.addstr(0, 0, header.format("self" if by_self else "total")[:(cols - 1)])
+            for (i, (title, s, t)) in enumerate(top):
+                line = "{:7.2f}% {:7.2f}%  {}".format(100.0 * s / total, 100.0 * t / total, title)
+                style = curses.color_pair(Colors256.selection_color()) if i == selection else 0
+                self.stdscr.addstr(i + 1, 0, line.ljust(cols - 1)[:(cols - 1)], style)
+            c = self.stdscr.getch()
+            if c == ord('j') or c == curses.KEY_DOWN:
+                selection = min(selection + 1, len(top) - 1)
+            elif c == ord('k') or c == curses.KEY_UP:
+                selection = max(selection - 1, 0)
+            elif c == ord('s'):
+                by_self = not by_self
+                selection = 0
+            elif c in (10, 13, curses.KEY_ENTER):
+                self.jump_to_title(top[selection][0])
+                return
+            elif c in (27, ord('q'), ord('t')):
+                self.render()
+                return
+
+    def _time_range_text(self):
+        (lo, hi) = self.frames.time_range
+        d = self.timeline[1]
+        return "time {:.2f}s-{:.2f}s".format(lo * d, hi * d)
+
+    # re-weights frames to the time range, keeping focus and selection
+    # on the closest frames with samples in it
+    def set_time_range(self, lo, hi):
+        selected_frames = self.selected_frames()
+        self.frames.set_time_range(lo, hi)
+        self.focus = self._find_nonempty_parent(self.focus)
+        self.pinned = self._find_nonempty_parent(self.pinned)
+        selected_frames = self._find_nonempty_parent(selected_frames)
+        self.rebuild_views(selected_frames if selected_frames else [])
+        self.render()
+
+    # samples over time of the frames shown, i.e. without excluded ones,
+    # in the last line. Selected range is highlighted
+    def draw_timeline(self):
+        rows, cols = self.stdscr.getmaxyx()
+        if rows < 3 or cols < 2:
+            return
+        n = self.timeline[0]
+        (lo, hi) = self.frames.time_range
+        w = min(n, cols - 1)
+        ranges = [(i * n // w, (i + 1) * n // w) for i in range(w)]
+        hist = self.frames.shown_hist()
+        samples = [hist.samples(a, b) for (a, b) in ranges]
+        levels = " .:-=+*#%@"
+        # everything might be excluded
+        top = max(samples) or 1
+        info = "{}, {} samples; h/l - move, -/+ - resize, a - all, enter - close"
+        self.stdscr.addstr(rows - 2, 0, info.format(self._time_range_text(), self.frames.total_samples).ljust(cols - 1)[:(cols - 1)])
+        self.stdscr.addstr(rows - 1, 0, " " * (cols - 1))
+        for (i, ((a, b), c)) in enumerate(zip(ranges, samples)):
+            style = curses.color_pair(Colors256.selection_color()) if a < hi and b > lo else 0
+            self.stdscr.addstr(rows - 1, i, levels[(len(levels) - 1) * c // top], style)
+
+    # 'T'
+    # selects time range for time-sliced profiles, graph is re-weighted
+    # as the range moves
+    def select_time_range(self):
+        if not self.timeline:
+            return
+        n = self.timeline[0]
+        while True:
+            self.draw_timeline()
+            (lo, hi) = self.frames.time_range
+            c = self.stdscr.getch()
+            if c == ord('h') or c == curses.KEY_LEFT:
+                if lo == 0:
+                    continue
+                (lo, hi) = (lo - 1, hi - 1)
+            elif c == ord('l') or c == curses.KEY_RIGHT:
+                if hi == n:
+                    continue
+                (lo, hi) = (lo + 1, hi + 1)
+            elif c == ord('-'):
+                if hi - lo == 1:
+                    continue
+                hi = hi - 1
+            elif c == ord('+') or c == ord('='):
+                if hi - lo == n:
+                    continue
+                (lo, hi) = (lo, hi + 1) if hi < n else (lo - 1, hi)
+            elif c == ord('a'):
+                (lo, hi) = (0, n)
+            elif c in (10, 13, 27, curses.KEY_ENTER, ord('q'), ord('T')):
+                self.render()
+                return
+            elif c == curses.KEY_RESIZE:
+                self.rebuild_views()
+                self.render()
+                continue
+            else:
+                continue
+            self.set_time_range(lo, hi)
+
     # 'n'
     def next_highlight(self):
         if self.highlight:
@@ -692,6 +1313,12 @@ class FlameCLI:
             if c == ord('/'):
                 self.search()
                 continue
+            if c == ord('t'):
+                self.top_functions()
+                continue
+            if c == ord('T'):
+                self.select_time_range()
+                continue
             if c == ord('n'):
                 self.next_highlight()
                 continue